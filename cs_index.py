@@ -0,0 +1,374 @@
+"""
+Shared C# method index for build_prompt.py and build_prompt_filter.py.
+
+Scans every .cs file under a directory once, recording each method's body,
+the PascalCase names it calls, and the [CommandMethod] attributes it carries.
+The result is pickled to a per-user cache directory, so later runs against
+an unchanged tree skip the parse entirely. The cache is unpickled on load, so
+it is trusted local state: it is kept outside the scanned tree, where it can
+never be committed with the sources and loaded on someone else's machine.
+"""
+
+import hashlib
+import os
+import pickle
+try:
+    # google-re2 (pip install google-re2) matches in linear time; the patterns below use
+    # inline flags and no lookarounds so they compile the same under the standard re.
+    import re2 as re
+except ImportError:
+    import re
+from pathlib import Path
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# --- Config ---------------------------------------------------------
+# Include only these extensions
+ALLOW_EXTS = {'.cs'}
+
+# Caches live in <user cache dir>/cs_index, one file per scanned root; bump the
+# version when the pickled layout changes so stale caches are rebuilt instead
+# of misread. Parsing changes need no bump: the key also carries a hash of this module.
+CACHE_DIR_NAME = "cs_index"
+CACHE_VERSION = 1
+
+# Trees with at least this many files are scanned across processes; below it,
+# starting the workers costs more than the scan itself.
+PARALLEL_MIN_FILES = 200
+# -------------------------------------------------------------------
+
+# --- Patterns -------------------------------------------------------
+# Patterns are bytes: indexing runs on the raw file contents and only the
+# text that ends up in a report is decoded.
+_COMMAND_ATTRIBUTE = b'[CommandMethod'
+_COMMAND_RE = re.compile(rb'\[CommandMethod\s*\(\s*"([^"]*)"[^\]]*\]')
+# Leading keywords that mark a line as a member declaration; checked as a set lookup
+# rather than as a regex alternation that backtracks through each keyword.
+_MODIFIERS = frozenset({b'public', b'private', b'internal', b'static', b'protected', b'async'})
+# Bytes that may appear in a C# identifier (names are matched as ASCII)
+_IDENT_BYTES = frozenset(b'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_')
+# Comments and string/char literals are consumed whole so braces inside them are
+# never counted; only group 1 ('{', '}' or ';') is real code structure.
+_TOKEN_RE = re.compile(b"(?s)" + b"|".join([
+    rb'//[^\n]*',                     # line comment
+    rb'/\*.*?\*/',                    # block comment
+    rb'(?:@\$?|\$@)"(?:[^"]|"")*"',   # verbatim string, "" escapes a quote
+    rb'"(?:\\.|[^"\\\n])*"',          # regular or interpolated string
+    rb"'(?:\\.|[^'\\\n])*'",          # char literal
+    rb'([{};])',
+]))
+# Consumes the '(' instead of looking ahead for it; the next name starts after it anyway
+_CALL_RE = re.compile(rb'\b([A-Z][a-zA-Z0-9_]*)\s*\(')
+# -------------------------------------------------------------------
+
+# A method found by index_file: its raw (undecoded) source and the PascalCase names it calls.
+MethodInfo = namedtuple("MethodInfo", ["body", "calls"])
+
+# The parsed tree:
+#   file_methods  {file_path: {method_name: MethodInfo}}
+#   method_index  {method_name: file_path}, the first file to define a name wins
+#   commands      {COMMAND_NAME: (method_name, file_path)}, names upper-cased
+#   from_cache    whether this came from the index cache rather than a fresh scan
+IndexedProject = namedtuple("IndexedProject", ["file_methods", "method_index", "commands", "from_cache"])
+
+class SourceFile:
+    """
+    A source file whose contents are read on demand and can be dropped once
+    indexed, so whole files are only held for the ones a report needs.
+    """
+    __slots__ = ("path", "_data")
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._data = None
+
+    def data(self) -> bytes:
+        """Returns the file's raw bytes, reading them on first use."""
+        if self._data is None:
+            self._data = self.path.read_bytes()
+        return self._data
+
+    def text(self) -> str:
+        """Returns the file's decoded text (see decode_source)."""
+        return decode_source(self.data())
+
+    def release(self):
+        """Drops the cached bytes; the next data() or text() call reads the file again."""
+        self._data = None
+
+def decode_source(data: bytes) -> str:
+    """
+    Decodes raw source bytes for a report: UTF-8 when valid, otherwise Latin-1, which
+    maps every byte, so legacy-encoded files keep their characters instead of losing them.
+    """
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        return data.decode("latin-1")
+
+def iter_source_files(root):
+    """
+    Yields an os.DirEntry for every file under root with an allowed extension, skipping hidden entries.
+    Uses os.scandir so file/dir checks come from the directory listing instead of a stat per path.
+    Directories that cannot be listed are skipped, as Path.rglob does.
+    """
+    subdirs = []
+    try:
+        entries = os.scandir(root)
+    except OSError:
+        return
+    with entries:
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.path)
+            elif entry.is_file(follow_symlinks=False) and os.path.splitext(entry.name)[1].lower() in ALLOW_EXTS:
+                yield entry
+    for subdir in subdirs:
+        yield from iter_source_files(subdir)
+
+def _skip_group(content: bytes, pos: int, end: int) -> int:
+    """
+    Returns the index just past the '(...)' or '[...]' group opened at content[pos], or -1
+    when it is still open at end. A closing bracket inside a "..." argument does not count.
+    """
+    opener = content[pos:pos + 1]
+    closer = b")" if opener == b"(" else b"]"
+    depth = 0
+    while pos < end:
+        char = content[pos:pos + 1]
+        if char == b'"':
+            pos += 1
+            while pos < end and content[pos:pos + 1] != b'"':
+                pos += 2 if content[pos:pos + 1] == b"\\" else 1
+        elif char == opener:
+            depth += 1
+        elif char == closer:
+            depth -= 1
+            if depth == 0:
+                return pos + 1
+        pos += 1
+    return -1
+
+def _skip_attributes(content: bytes, pos: int, end: int) -> int:
+    """
+    Returns the index of the first byte on a line past its indentation and any leading
+    [...] attributes, or -1 when an attribute is still open at end.
+    """
+    while True:
+        while pos < end and content[pos:pos + 1] in (b" ", b"\t"):
+            pos += 1
+        if content[pos:pos + 1] != b"[":
+            return pos
+        pos = _skip_group(content, pos, end)
+        if pos < 0:
+            return -1
+
+def match_signature(content: bytes, start: int, end: int):
+    """
+    Looks for a method signature in content[start:end] and returns (sig_start, method_name), or None.
+    A signature line begins with one of _MODIFIERS, after any [...] attributes on the same line,
+    and names the method as the identifier right before its parameter list's '('. A '(' that
+    opens a tuple return type is skipped; lines that declare no method are skipped too.
+
+    >>> content = b'[CommandMethod("ONELINE")] public static void OneLine()'
+    >>> match_signature(content, 0, len(content))
+    (27, 'OneLine')
+    >>> content = b'public static (Document doc, Database db, Editor ed) GetGlobals()'
+    >>> match_signature(content, 0, len(content))
+    (0, 'GetGlobals')
+    """
+    paren = content.find(b"(", start, end)
+    while paren >= 0:
+        line_start = max(content.rfind(b"\n", start, paren) + 1, start)
+        line_end = content.find(b"\n", paren, end)
+        if line_end < 0:
+            line_end = end
+        decl_start = _skip_attributes(content, line_start, line_end)
+        if decl_start > paren:
+            # The '(' belonged to an attribute; look again past it
+            paren = content.find(b"(", decl_start, line_end)
+        while decl_start >= 0 and paren >= 0:
+            line = content[decl_start:paren].rstrip()
+            words = line.split(None, 1)
+            if not words or words[0] not in _MODIFIERS:
+                break
+            name_start = len(line)
+            while name_start > 0 and line[name_start - 1] in _IDENT_BYTES:
+                name_start -= 1
+            name = line[name_start:]
+            if name and name not in _MODIFIERS and not name[:1].isdigit():
+                return decl_start, name.decode("ascii")
+            # No name before this '(', so it opens a tuple type such as (Document doc, Editor ed)
+            close = _skip_group(content, paren, line_end)
+            paren = content.find(b"(", close, line_end) if close >= 0 else -1
+        paren = content.find(b"(", line_end, end)
+    return None
+
+def index_file(content: bytes) -> dict:
+    """
+    Scans a file once and returns {method_name: MethodInfo(body, calls)}.
+
+    Every '{' in code opens a scope; when the text since the previous ';', '{'
+    or '}' looks like a method signature the scope is recorded as a method, and
+    its body and PascalCase call sites are captured when the matching '}' closes
+    it. Braces inside comments, strings and char literals are skipped.
+    """
+    methods = {}
+    scopes = []
+    header_start = 0
+
+    for token in _TOKEN_RE.finditer(content):
+        char = token.group(1)
+        if char is None:
+            continue
+        pos = token.start()
+        if char == b'{':
+            scopes.append(match_signature(content, header_start, pos))
+        elif char == b'}' and scopes:
+            scope = scopes.pop()
+            if scope:
+                start, method_name = scope
+                if method_name not in methods:
+                    body = content[start:pos + 1]
+                    methods[method_name] = MethodInfo(body, frozenset(call.group(1).decode("ascii") for call in _CALL_RE.finditer(body)))
+        header_start = pos + 1
+    return methods
+
+def index_commands(content: bytes) -> dict:
+    """
+    Returns {COMMAND_NAME: method_name} for the [CommandMethod("...")] attributes in a file.
+    Command names are upper-cased so lookups are case-insensitive.
+    """
+    commands = {}
+    # Most files declare no commands; a literal substring search rejects them before any regex runs
+    attribute_start = content.find(_COMMAND_ATTRIBUTE)
+    if attribute_start < 0:
+        return commands
+    for match in _COMMAND_RE.finditer(content, attribute_start):
+        # The signature follows the attribute, so scan forward in place rather than
+        # slicing off the rest of the file and running a regex over it.
+        signature = match_signature(content, match.end(), len(content))
+        if signature:
+            commands.setdefault(decode_source(match.group(1)).upper(), signature[1])
+    return commands
+
+def scan_source(source: SourceFile):
+    """
+    Indexes one file's methods and commands, then drops its contents.
+    Returns (path, {method_name: MethodInfo}, {COMMAND_NAME: method_name}).
+    """
+    content = source.data()
+    methods = index_file(content)
+    commands = index_commands(content)
+    source.release()
+    return source.path, methods, commands
+
+def _scan_path(path: Path):
+    """Process-pool worker: scans one file by path, so only the path is sent to the worker."""
+    return scan_source(SourceFile(path))
+
+def _available_cpus() -> int:
+    """Returns the number of CPUs this process may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def build_index(paths: list) -> IndexedProject:
+    """
+    Scans the given files and returns a fresh IndexedProject.
+    """
+    file_methods = {}
+    method_index = {}
+    command_index = {}
+    if not paths:
+        return IndexedProject(file_methods, method_index, command_index, False)
+
+    # Scanning is CPU bound, so large trees fan out over processes (Windows caps a
+    # process pool at 61 workers). Small trees use threads, which still overlap the
+    # reads since the GIL is released while reading.
+    cpus = _available_cpus()
+    if len(paths) >= PARALLEL_MIN_FILES and cpus > 1:
+        executor = ProcessPoolExecutor(max_workers=min(cpus, 61))
+        scan, items, chunksize = _scan_path, paths, 32
+    else:
+        executor = ThreadPoolExecutor(max_workers=min(32, len(paths)))
+        scan, items, chunksize = scan_source, map(SourceFile, paths), 1
+
+    # map() yields results in file order, so the first file to define a name still wins
+    with executor as pool:
+        for path, methods, commands in pool.map(scan, items, chunksize=chunksize):
+            file_methods[path] = methods
+            for method_name in methods:
+                method_index.setdefault(method_name, path)
+            for command_name, method_name in commands.items():
+                command_index.setdefault(command_name, (method_name, path))
+    return IndexedProject(file_methods, method_index, command_index, False)
+
+def _indexer_digest() -> str:
+    """Returns a hash of this module's source, so any change to how files are parsed invalidates old caches."""
+    return hashlib.sha256(Path(__file__).read_bytes()).hexdigest()
+
+def _cache_path(root: Path) -> Path:
+    """
+    Returns the cache file for a scanned root: %LOCALAPPDATA%, $XDG_CACHE_HOME or
+    ~/.cache, then cs_index/<hash of the root path>.pkl.
+    """
+    base = os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    key = hashlib.sha256(str(root).encode("utf-8")).hexdigest()[:16]
+    return Path(base) / CACHE_DIR_NAME / f"{key}.pkl"
+
+def load_or_build(root: Path) -> IndexedProject:
+    """
+    Returns the index for every source file under root, reusing the cached index when
+    no file has been added, removed or modified since it was written.
+    """
+    root = Path(root).resolve()
+    entries = list(iter_source_files(root))
+    # The indexer's hash, the root and (relative path, mtime, size) per file; any change
+    # to the parser or the tree changes the key
+    signature = [_indexer_digest(), str(root)]
+    for entry in entries:
+        stat = entry.stat()
+        signature.append((os.path.relpath(entry.path, root), stat.st_mtime_ns, stat.st_size))
+    cache_path = _cache_path(root)
+
+    try:
+        with open(cache_path, "rb") as f:
+            version, cached_signature, project = pickle.load(f)
+        if version == CACHE_VERSION and cached_signature == signature:
+            return project._replace(from_cache=True)
+    except Exception:
+        # Missing, unreadable or stale cache; fall through and rebuild it
+        pass
+
+    project = build_index([Path(e.path) for e in entries])
+    if entries:
+        tmp_path = cache_path.with_name(cache_path.name + ".tmp")
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                pickle.dump((CACHE_VERSION, signature, project), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+        except (OSError, pickle.PicklingError) as e:
+            print(f"Warning: Could not write index cache '{cache_path}': {e}")
+            # Don't leave a partial dump behind
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+    return project
+
+def get_entry_point(project: IndexedProject, target_command: str):
+    """
+    Finds the method name and file associated with [CommandMethod("target_command")].
+    Returns (None, None) when no file declares the command.
+    """
+    return project.commands.get(target_command.upper(), (None, None))
+
+def find_project_dependencies(method: MethodInfo, method_index: dict) -> set:
+    """
+    Returns the calls made by a method that resolve to methods defined in the project.
+    """
+    return method.calls & method_index.keys()